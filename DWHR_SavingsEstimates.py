@@ -4,9 +4,11 @@ Created on Tue Nov 21 13:13:21 2017
 
 This script predicts the energy savings of DWHR devices. It works based on the following principles:
     
-1. It uses glob and a for loop to iterate through and repeat all calculations on a list of draw profiles.This means that the analysis can be performed on 
+1. It uses os.scandir and a pool of processes to repeat all calculations on a list of draw profiles, several draw profiles at a time.This means that the analysis can be performed on 
 several different draw profiles all at once by storing the draw profiles in the specified folder. The draw profiles are specified in the Path_DrawProfiles 
-variable (Line 56 at this time)
+variable (Line 56 at this time). Draw profiles that already have an analyzed file newer than both the draw profile and this script are not analyzed again, their
+savings are read from the analyzed file instead. Editing the inputs or constants in this script therefore analyzes every draw profile again. Set Reanalyze_All to
+True to do the same after replacing the coefficient files
 
 2. It calculates the effectiveness using the methods documented at https://title24stakeholders.com/measures/cycle-2019/drain-water-heat-recovery/
 A brief summary: Curve coefficients define a performance map predicting a a correction factor stating the performance of a generic DWHR device as
@@ -19,7 +21,7 @@ flow configuration. This is simply using the performance map to find the correct
 in that draw, and calculating Q = Effectiveness * m * C_p * dT
 
 4. It performs the same calculations assuming that the DWHR device is installed in the Unequal - Water Heater configuration. The main difference is that the 
-flow rate through the cold side is now less than the flow rate through the drain side, and must be calculated. The function Calculate_Fraction_Cold_ThroughDWHR
+flow rate through the cold side is now less than the flow rate through the drain side, and must be calculated. The function Fraction_Cold_Unequal_WaterHeater
 performs an energy balance to identify the fraction of water passing through the fixture that came from the cold side, based on the outlet temperature from the 
 cold side of the DWHR device. That fraction is then multiplied by the total flow rate to identify the cold-side flow rate. The same process as in step 3 can then 
 be used
@@ -32,8 +34,12 @@ then uses an while loop to implement the iterative solution. The while loop uses
 rate before the calculations and the flow rate after the calculations differ by less than 0.01 gal/min, the solution is accepted. It's imperative that this code 
 converge quickly, to reduce computation time. To assist this, the correction factor method was replaced with another method from Ramin Manouchehri because it was
 found to converge in fewer iterations. That work is documented at: https://uwspace.uwaterloo.ca/handle/10012/10035
+The iterative solution is performed by solve_unequal_fixture, which is compiled with numba. Each draw iterates on its own until it converges, instead of
+every draw being recalculated until the slowest draw in the profile converges, and uses the secant method to reach convergence in fewer iterations. Each draw
+starts from the fraction of cold water in the previous draw's solution, so most draws converge in a single iteration.
 
-6. It then saves the file with the new calculations to a file with '_Analyzed' added to the end of the file name.
+6. It then saves the file with the new calculations to a file with '_Analyzed' added to the end of the file name. The analyzed file is saved as a .parquet file unless
+Output_Format is set to 'csv'.
 
 Desired future changes:
     -It would be nice to program a version of this script as a function. This could be combined with the draw profile generation script (Which would also be programmed
@@ -47,19 +53,23 @@ Desired future changes:
 
 import pandas as pd
 import numpy as np
-import itertools
 import math
-import glob
+import os
 import time
+from concurrent.futures import ProcessPoolExecutor
+from numba import njit, prange, set_num_threads, config
 
 #%%------------------INPUTS------------------------
     
-Path_DrawProfiles = r'C:\Users\Peter Grant\Desktop\DWHRAnalysis' #The folder where all of the draw profiles to be analyzed are located
+Path_DrawProfiles = r'C:\Users\Peter Grant\Desktop\DWHRAnalysis' #The folder where all of the draw profiles to be analyzed are located. Draw profiles can be stored as .csv or .parquet files
+Path_Results = r'C:\Users\Peter Grant\Desktop\DWHRAnalysis\Results.csv' #The file where the savings of every draw profile are saved
+Output_Format = 'parquet' #The format used to save the analyzed draw profiles. 'parquet' is much faster to write and read back than 'csv', which is still available for opening the results in Excel
+Reanalyze_All = False #Draw profiles with an analyzed file newer than the draw profile and this script are skipped unless this is True. Set it to True after replacing the coefficient files, which aren't checked
 
-Coefficients_Generic_Vertical_Unequal = np.fromfile(r'C:\Users\Peter Grant\Dropbox (Beyond Efficiency)\Beyond Efficiency Team Folder\Frontier Energy-TRC 2022 Title 24 MF CASE Support\DWHR\Analysis\Coefficients\Generic_Vertical_Unequal.csv') #The path to the coefficients for the unequal flow generic model of DWHR devices
-Coefficients_Generic_Vertical_Equal = np.fromfile(r'C:\Users\Peter Grant\Dropbox (Beyond Efficiency)\Beyond Efficiency Team Folder\Frontier Energy-TRC 2022 Title 24 MF CASE Support\DWHR\Analysis\Coefficients\Generic_Vertical_Equal.csv') #The path to the coefficients for the equal flow generic model of DWHR devices
+Coefficients_Generic_Vertical_Unequal = np.load(r'C:\Users\Peter Grant\Dropbox (Beyond Efficiency)\Beyond Efficiency Team Folder\Frontier Energy-TRC 2022 Title 24 MF CASE Support\DWHR\Analysis\Coefficients\Generic_Vertical_Unequal.npy') #The path to the coefficients for the unequal flow generic model of DWHR devices. Stored as a matrix where row i, column j is the coefficient of x**i * y**j
+Coefficients_Generic_Vertical_Equal = np.load(r'C:\Users\Peter Grant\Dropbox (Beyond Efficiency)\Beyond Efficiency Team Folder\Frontier Energy-TRC 2022 Title 24 MF CASE Support\DWHR\Analysis\Coefficients\Generic_Vertical_Equal.npy') #The path to the coefficients for the equal flow generic model of DWHR devices
 
-#Commented out coefficients are taken from Bo's script, added here for comparison purposes
+#Commented out coefficients are taken from Bo's script, added here for comparison purposes. They are listed as flat lists, the unequal coefficients need to be reshaped to a matrix before use
 #Coefficients_Generic_Vertical_Unequal = [
 #	1.50240798e+00, -1.54775844e+00, 7.71878873e-01, -1.21373939e-01, 1.01401103e+00,
 #	-1.98860634e-01, -1.29877294e-01, 3.56076077e-02, -2.21066737e-01, 9.21985918e-02,
@@ -74,6 +84,7 @@ Effectiveness_Rated = 0.42 #The rated effectiveness of the DWHR device tested un
 
 SpecificHeat_Water = 0.998 #Btu/(lb_m-F) @ 80 deg F, http://www.engineeringtoolbox.com/water-properties-d_1508.html
 Density_Water = 8.3176 #lb-m/gal @ 80 deg F, http://www.engineeringtoolbox.com/water-density-specific-weight-d_595.html
+HeatCapacity_Water = Density_Water * SpecificHeat_Water #Btu/(gal-F), the heat needed to warm one gallon of water by one degree. Every heat transfer calculation uses this product
     
 #Hot water temperature constants are taken from pg B-3 of the 2016 CBECC ACM reference manual
 #These constants can be changed if wanting to try different arrangements (E.g. A different water heater set temperature)
@@ -83,164 +94,280 @@ Temperature_WaterHeater = 115 #deg F
 #The temperature of water entering the DWHR device will be lower than the shower temperature
 Temperature_Drain_Inlet = 100.4 #deg F, the temperature of water entering the drain side of the device
 
+FlowRate_Effectiveness_Minimum = 0.5 #gal/min, set a lower bound to the flow rate used to calculate the effectiveness. This helps stabilize the iterative solution, brings about faster results
+FlowRate_Effectiveness_Maximum = 7.5 #gal/min, set an upper bound to the flow rate used to calculate the effectiveness. This helps stabilize the iterative solution, bring about faster results
+
+#The iterative Unequal-Fixture solution stops after this many iterations on a draw, even if it hasn't converged. This guarantees that the calculations finish
+#on draws that oscillate or diverge
+Iterations_Maximum = 50
+
+#The Unequal-Fixture draws are solved in blocks of this many consecutive draws. Each draw in a block after the first starts from the fraction of cold water the previous
+#draw converged to, which is usually much closer to the solution than the hot flow rate in the draw profile. The blocks are spread across threads, and the block size
+#doesn't depend on the number of threads so the results are the same on every machine. Because of the different starting points, identical draws can give results
+#that differ by up to the 0.01 gal/min convergence tolerance depending on the draws before them
+Draws_Per_Block = 256
+
 #%%-------------------CREATE DATA STORAGE DATA FRAMES-------------------------
 
-Results = pd.DataFrame(columns = ['Filename', 'Savings, Equal (therms)', 'Savings, Unequal-WaterHeater (therms)', 'Savings, Unequal-Fixture (therms)'])
-Temp = pd.DataFrame(columns = ['Filename', 'Savings, Equal (therms)', 'Savings, Unequal-WaterHeater (therms)', 'Savings, Unequal-Fixture (therms)'])
+Results_Columns = ['Filename', 'Savings, Equal (therms)', 'Savings, Unequal-WaterHeater (therms)', 'Savings, Unequal-Fixture (therms)'] #The columns of the Results data frame, which is created from the savings of every draw profile once they have all been analyzed
     
 #%%-------------------DEFINE FUNCTIONS----------------
 
+@njit(cache=True)
 def FourthOrder(List, Condition): #Returns the value of a fourth order polynomial given the curve-fit parameters, and the value of the independent variable
-    return List[0] * Condition**4 + List[1] * Condition**3 + List[2] * Condition**2 + List[3] * Condition + List[4]
+    return (((List[0] * Condition + List[1]) * Condition + List[2]) * Condition + List[3]) * Condition + List[4] #Evaluated with Horner's rule, which avoids calculating each power separately
     
-#This functions performs an energy balance at the fixture, using the specified flow rates, temperatures, and installation configuration to predict the
-#fraction of total flow that is cold water, and therefore passes through the cold side of the DWHR device
-def Calculate_Fraction_Cold_ThroughDWHR(Flow_Shower, Temperature_Mains, Temperature_Shower, Temperature_WaterHeater, Configuration):
-    if Configuration == 'Equal': #If the DWHR device is installed in an equal flow configuration
-        Flow_Drain = Flow_Shower #Then the drain side flow rate is equal to the total flow rate
-        Flow_Cold = Flow_Shower #Then the cold side flow rate is equal to the total flow rate
-        Fraction_Cold_ThroughDWHR = 1 #All of the water going down the drain passes through the cold side of the DWHR device
-    elif Configuration == 'Unequal_WaterHeater' or Configuration == 'Unequal_Fixture': #If the DWHR device is installed in either the Unequal-WaterHeater or Unequal-Shower configuration
-        Flow_Drain = Flow_Shower #Then the flow rate through the drain is equal to the shower flow rate
-        Flow_Cold = Flow_Shower * (Temperature_Shower - Temperature_WaterHeater) / (Temperature_Mains - Temperature_WaterHeater) #Calculates the flow rate through the cold side of the DWHR device by performing an energy balance
-        if Configuration == 'Unequal_Fixture':
-            Fraction_Cold_ThroughDWHR = Flow_Cold / Flow_Drain #Calculates the fraction of water passing through the DWHR device that has passed through the cold side of the device
-        elif Configuration == 'Unequal_WaterHeater':
-            Fraction_Cold_ThroughDWHR = 1 - (Flow_Cold / Flow_Drain)
-    return Fraction_Cold_ThroughDWHR
-
-#This function evaluates a 2-dimensional polynomial with the inputs x, y and the coefficients m
-def polyval2d(x, y, m):
-    order = int(np.sqrt(len(m))) - 1
-    ij = itertools.product(range(order+1), range(order+1))
-    z = np.zeros_like(x)
-    for a, (i,j) in zip(m, ij):
-        z += a * x**i * y**j
-    return z
-
-#This makes it slightly easier to calculate the natural log of something in the code? Doesn't seem worth having as a function, may delete
-def log(x):
-    return math.log(x)
-
-#This function finds the text between two different entries in a string. The inputs are he full string, the text preceeding the portion you want, and the text
-#folowwing the portion you want. For instance, calling the function on this comment with First = 'For instance, ' and Last = ' on this comment' would return
-#'calling the function'
-def Find_Between(String, First, Last):
-    try:
-        Start = String.index(First) + len(First)
-        End = String.index(Last, Start)
-        return String[Start:End]
-    except ValueError:
-        return ""
+#These functions perform an energy balance at the fixture, using the specified temperatures to predict the fraction of total flow that is cold water, and therefore
+#passes through the cold side of the DWHR device. Temperature_Cold is the temperature of the cold water reaching the fixture: the mains temperature in the
+#Unequal-WaterHeater configuration, and the cold-side outlet temperature of the DWHR device in the Unequal-Fixture configuration. In either configuration the flow
+#rate through the drain is equal to the shower flow rate, so the energy balance at the fixture gives Flow_Cold / Flow_Drain directly and the flow rate cancels out.
+#In the Equal configuration all of the water passes through the cold side, so it doesn't need a function. The Unequal-Fixture function is compiled with numba
+#because the iterative solution in evaluate_unequal_fixture calls it on every iteration
+@njit(cache=True)
+def Fraction_Cold_Unequal_Fixture(Temperature_Cold, Temperature_Shower, Temperature_WaterHeater):
+    return (Temperature_Shower - Temperature_WaterHeater) / (Temperature_Cold - Temperature_WaterHeater) #Calculates the fraction of water passing through the DWHR device that has passed through the cold side of the device
+
+def Fraction_Cold_Unequal_WaterHeater(Temperature_Cold, Temperature_Shower, Temperature_WaterHeater):
+    return (Temperature_Cold - Temperature_Shower) / (Temperature_Cold - Temperature_WaterHeater) #1 - the Unequal_Fixture fraction, simplified to a single subtraction and division
+
+#This function evaluates a 2-dimensional polynomial with the inputs x, y and the coefficients c
+def polyval2d(x, y, c): #c[i, j] is the coefficient of x**i * y**j
+    return np.polynomial.polynomial.polyval2d(x, y, c) #numpy evaluates the polynomial with Horner's rule in each variable. This was timed against an einsum over Vandermonde matrices of x and y, which took 1.5-2x as long
+
+#This function checks that a cold side flow rate can be used in the Unequal-Fixture energy balance. It has to be positive and finite, or log(flow / flow_cold) and
+#the outlet temperature are undefined
+@njit(cache=True)
+def is_valid_flow(flow_cold):
+    return flow_cold > 0 and math.isfinite(flow_cold)
+
+#The fast math options used by the compiled Unequal-Fixture functions. fastmath=True would also let LLVM assume no value is ever NaN or infinite, which removes the
+#NaN comparisons the solver relies on to catch draws it can't solve. These flags only allow fused multiply-adds, reordering sums and products, and reciprocals
+FastMath_Flags = {'contract', 'reassoc', 'arcp'}
+
+#This function performs one pass of the Unequal-Fixture energy balance for a single draw. Given an assumed cold side flow rate it calculates the heat recovered
+#(Using Ramin Manouchehri's flow ratio correction), the cold-side outlet temperature and the cold side flow rate that outlet temperature leads to at the fixture
+@njit(cache=True, fastmath=FastMath_Flags)
+def evaluate_unequal_fixture(flow, mains, dT_drain, flow_cold, coeffs, eff_rated, T_shower, T_wh, rho_cp):
+    flow_minimum = min(flow, flow_cold)
+    effectiveness = FourthOrder(coeffs, flow_minimum) * eff_rated
+    heat_rate_equal = effectiveness * flow_minimum * rho_cp * dT_drain #Calcualte the heat recovery rate of the draw in Btu/min
+    heat_rate = heat_rate_equal * (0.3452 * math.log(flow / flow_cold) + 1) #Calculate the heat recovery rate per Ramin Manoucheri's paper and method
+    T_out = heat_rate / (flow_cold * rho_cp) + mains #Calculate the outlet temperature of the DWHR device in this draw
+    flow_cold_new = flow * Fraction_Cold_Unequal_Fixture(T_out, T_shower, T_wh) #Calculate the cold-side flow rate using the newly calculated cold-side outlet temperature
+    return effectiveness, heat_rate, T_out, flow_cold_new
+
+#This function performs the iterative Unequal-Fixture solution for every draw in a profile. Each draw starts from the fraction of cold water the previous draw in its
+#block of Draws_Per_Block draws converged to. The first draw in a block, and any draw after one that was skipped or didn't converge, assumes the cold side flow rate
+#is the total flow rate minus the hot flow rate instead. The draw takes one plain step by feeding that through evaluate_unequal_fixture. After that it uses the
+#secant method on the difference between the assumed and calculated cold side flow rates, which converges in far fewer iterations than repeatedly substituting the
+#calculated flow rate back in. If the secant step can't be calculated, or would give a cold side flow rate that isn't positive and finite, it falls back to the plain
+#step. A draw is solved when the cold side flow rate changes by less than 0.01 gal/min between iterations, or Iterations_Maximum is reached. The saved values are
+#then evaluated at the accepted cold side flow rate, so they all describe the same state. Each draw converges on its own, and the blocks are spread across threads
+#with prange. Draws with no flow, or where the hot flow rate is at least the total flow rate, have no cold water passing through the DWHR device. The same is true of
+#draws where a plain step gives a cold side flow rate that isn't positive and finite, such as draws with a NaN mains temperature. The flow ratio correction is
+#undefined for all of them, so they recover no heat. Returns the heat recovered, final cold side flow rate, cold-side outlet temperature, equal flow effectiveness
+#and heat recovery rate of each draw
+@njit(cache=True, fastmath=FastMath_Flags, parallel=True)
+def solve_unequal_fixture(flow, mains, hot, duration, coeffs_equal, eff_rated, T_drain, T_shower, T_wh, rho_cp):
+    n = len(flow)
+    heat_recovered = np.empty(n)
+    flow_cold_final = np.empty(n)
+    fixture_T = np.empty(n)
+    effectiveness_final = np.empty(n)
+    heat_rate_final = np.empty(n)
+    coeffs = (coeffs_equal[0], coeffs_equal[1], coeffs_equal[2], coeffs_equal[3], coeffs_equal[4]) #The equal flow curve is always fourth order. Unpacking it into a fixed size tuple lets numba compile FourthOrder to a straight chain of multiply-adds with no array lookups
+    for block in prange((n + Draws_Per_Block - 1) // Draws_Per_Block):
+        fraction_cold = 0.0 #The fraction of cold water the previous draw in this block converged to, 0 until a draw in the block has been solved
+        for row in range(block * Draws_Per_Block, min(n, (block + 1) * Draws_Per_Block)):
+            solvable = flow[row] > 0 and hot[row] < flow[row] #No cold water passes through the DWHR device otherwise, so log(flow / flow_cold) would be infinite or NaN
+            if solvable:
+                dT_drain = T_drain - mains[row] #Doesn't change between iterations
+                if fraction_cold > 0:
+                    flow_cold_previous = fraction_cold * flow[row] #Start from the previous draw's solution
+                else:
+                    flow_cold_previous = flow[row] - hot[row] #Set the cold side flow rate equal to the total flow rate - the hot flow rate
+                flow_cold = evaluate_unequal_fixture(flow[row], mains[row], dT_drain, flow_cold_previous, coeffs, eff_rated, T_shower, T_wh, rho_cp)[3]
+                solvable = is_valid_flow(flow_cold) #A NaN mains temperature, or an outlet temperature above the water heater temperature, leaves no valid cold side flow rate
+                residual_previous = flow_cold - flow_cold_previous #The difference between the calculated and assumed cold side flow rates, which is 0 at the solution
+                delta = residual_previous
+                iterations = 1
+                while solvable and abs(delta) >= 0.01 and iterations < Iterations_Maximum: #Convergence is identified when the cold side flow rate before and after calculations differ by less than 0.01 gal/min
+                    flow_cold_new = evaluate_unequal_fixture(flow[row], mains[row], dT_drain, flow_cold, coeffs, eff_rated, T_shower, T_wh, rho_cp)[3]
+                    if not is_valid_flow(flow_cold_new):
+                        solvable = False
+                        break
+                    residual = flow_cold_new - flow_cold
+                    if abs(residual - residual_previous) > 1e-12:
+                        flow_cold_next = flow_cold - residual * (flow_cold - flow_cold_previous) / (residual - residual_previous) #Secant step towards the cold side flow rate where the residual is 0
+                        if not is_valid_flow(flow_cold_next):
+                            flow_cold_next = flow_cold_new
+                    else:
+                        flow_cold_next = flow_cold_new
+                    flow_cold_previous = flow_cold
+                    residual_previous = residual
+                    delta = flow_cold_next - flow_cold
+                    flow_cold = flow_cold_next
+                    iterations += 1
+            if solvable:
+                effectiveness, heat_rate, T_out, flow_cold_new = evaluate_unequal_fixture(flow[row], mains[row], dT_drain, flow_cold, coeffs, eff_rated, T_shower, T_wh, rho_cp) #The last evaluation was at the cold side flow rate before the final step. Evaluate the accepted flow rate so every saved value describes the same state
+                fraction_cold = flow_cold / flow[row] if abs(delta) < 0.01 else 0.0 #Only a converged draw is used to start the next one
+                heat_recovered[row] = heat_rate * duration[row]
+                flow_cold_final[row] = flow_cold
+                fixture_T[row] = T_out
+                effectiveness_final[row] = effectiveness
+                heat_rate_final[row] = heat_rate
+            else:
+                heat_recovered[row] = 0
+                flow_cold_final[row] = 0
+                fixture_T[row] = mains[row] #No heat is recovered, so the cold-side outlet temperature is the mains temperature
+                effectiveness_final[row] = 0
+                heat_rate_final[row] = 0
+                fraction_cold = 0.0 #The next draw starts from its own hot flow rate, not from a draw before this one
+    return heat_recovered, flow_cold_final, fixture_T, effectiveness_final, heat_rate_final
+
+#This function performs the Equal flow calculations on the raw arrays from a draw profile in a single pass, and returns the calculated columns. The flow rate used to
+#calculate the effectiveness is limited to the range between the minimum and maximum. The polyval2d function then uses that flow rate on both sides of the device and
+#the loaded coefficients to identify the effectiveness correction factor, which is multiplied by the rated effectiveness to find the actual effectiveness in each draw
+def calculate_equal(flow, volume, mains, dT_drain):
+    flow_effectiveness = np.clip(flow, FlowRate_Effectiveness_Minimum, FlowRate_Effectiveness_Maximum)
+    effectiveness = polyval2d(flow_effectiveness, flow_effectiveness, Coefficients_Generic_Vertical_Unequal) * Effectiveness_Rated
+    return {'FlowRate Effectiveness Equal (gal/min)': flow_effectiveness,
+            'Effectiveness Equal (-)': effectiveness,
+            'Savings Equal (Btu)': effectiveness * volume * HeatCapacity_Water * dT_drain,
+            'Heat Transfer Rate, Equal (Btu/min)': effectiveness * flow * HeatCapacity_Water * dT_drain,
+            'Cold-Side Outlet Temperature, Equal (deg F)': effectiveness * dT_drain + mains} #The flow rate and heat capacity cancel out of heat transfer rate / (flow * HeatCapacity_Water)
 
 
 #%%------------------CALCULATIONS--------------------
 
-Draw_Profiles = glob.glob(Path_DrawProfiles +  '/*.csv') #Use glob to create a list of all of the .csv files in the Path_DrawProfiles folder
-
-for i in Draw_Profiles: #Repeat once for each file in Draw_Profiles. Note that i will be the actual filename, not an index number
-    Draw_Profile = pd.read_csv(i) #Open the .csv file 
+#This function performs all of the calculations on a single draw profile, saves the analyzed draw profile to a new file with '_Analyzed' added to the end of the file
+#name, and returns the savings in each configuration. Draw profiles don't depend on each other, so it's called on several draw profiles at once in separate processes
+def analyze_profile(Path_DrawProfile):
+    if Path_DrawProfile.endswith('.parquet'):
+        Draw_Profile = pd.read_parquet(Path_DrawProfile, engine = 'pyarrow') #Open the .parquet file
+    else:
+        Draw_Profile = pd.read_csv(Path_DrawProfile, engine = 'pyarrow') #Open the .csv file. The pyarrow parser is several times faster than the default parser
     #Draw_Profile = Draw_Profile[Draw_Profile['Fixture'] == 'SHWR'] #Filter the draw profile to only include shower draws. This line will likely be removed before use
 
-    Draw_Profile['Mixed Water Volume (gal)'] = Draw_Profile['Flow Rate (gpm)'] * Draw_Profile['Duration (min)'] #Calculate the total volume of each draw
-    Draw_Profile['FlowRate Effectiveness Minimum (gal/min)'] = 0.5 #Set a lower bound to the flow rate used to calculate the effectiveness. This helps stabilize the iterative solution, brings about faster results
-    Draw_Profile['FlowRate Effectiveness Maximum (gal/min)'] = 7.5 #Set an upper bound to the flow rate used to calculate the effectiveness. This helps stabilize the iterative solution, bring about faster results
+    #Pull the inputs that every configuration uses out of the data frame once, so all of the calculations work on raw float64 arrays instead of pandas columns. The data
+    #frame is only used again to save the analyzed draw profile
+    Flow = Draw_Profile['Flow Rate (gpm)'].to_numpy(dtype = np.float64)
+    Mains = Draw_Profile['Mains Temperature (deg F)'].to_numpy(dtype = np.float64)
+    Hot = Draw_Profile['Hot Water Flow Rate (gpm)'].to_numpy(dtype = np.float64)
+    Duration = Draw_Profile['Duration (min)'].to_numpy(dtype = np.float64)
+    DeltaT_Drain = Temperature_Drain_Inlet - Mains #The temperature difference between the water entering the drain side and the mains water, which doesn't change between configurations
+
+    Calculations = {} #The calculated columns are collected here and added to the draw profile all at once at the end, instead of growing the data frame one column at a time
+
+    Calculations['Mixed Water Volume (gal)'] = Flow * Duration #Calculate the total volume of each draw
     #Equal Flow calculations
 
-    Start_Equal = time.time()
+    if __debug__: #The timing is only for checking performance. Running the script with python -O strips it out
+        Start_Equal = time.time()
 
-    Draw_Profile['FlowRate Effectiveness Equal (gal/min)'] = np.where(Draw_Profile['Flow Rate (gpm)'] >= Draw_Profile['FlowRate Effectiveness Minimum (gal/min)'], Draw_Profile['Flow Rate (gpm)'], Draw_Profile['FlowRate Effectiveness Minimum (gal/min)']) #In all rows where the cold side flow rate is larger than the minimum, keep the flow rate. Otherwise, replace the flow rate with the minimum
-    Draw_Profile['FlowRate Effectiveness Equal (gal/min)'] = np.where(Draw_Profile['FlowRate Effectiveness Equal (gal/min)'] <= Draw_Profile['FlowRate Effectiveness Maximum (gal/min)'], Draw_Profile['FlowRate Effectiveness Equal (gal/min)'], Draw_Profile['FlowRate Effectiveness Maximum (gal/min)'])     #In all rows where the cold side flow rate is larger than the maximum, keep the flow rate. Otherwise, replace the flow rate with the maximum
-    
-    Draw_Profile['Effectiveness Equal (-)'] = polyval2d(Draw_Profile['FlowRate Effectiveness Equal (gal/min)'], Draw_Profile['FlowRate Effectiveness Equal (gal/min)'], Coefficients_Generic_Vertical_Unequal) * Effectiveness_Rated #Call the polyval2d function using the specified flow rates and the loaded coefficients to identify the effectiveness correction factor for this scenario. Then multiply by the rated effectiveness to find the actual effectiveness in this draw
-    Draw_Profile['Savings Equal (Btu)'] = Draw_Profile['Effectiveness Equal (-)'] * Draw_Profile['Mixed Water Volume (gal)'] * Density_Water * SpecificHeat_Water * (Temperature_Drain_Inlet - Draw_Profile['Mains Temperature (deg F)'])
-    Draw_Profile['Heat Transfer Rate, Equal (Btu/min)'] = Draw_Profile['Effectiveness Equal (-)'] * Draw_Profile['Flow Rate (gpm)'] * Density_Water * SpecificHeat_Water * (Temperature_Drain_Inlet - Draw_Profile['Mains Temperature (deg F)'])
-    Draw_Profile['Cold-Side Outlet Temperature, Equal (deg F)'] = Draw_Profile['Heat Transfer Rate, Equal (Btu/min)'] / (Draw_Profile['Flow Rate (gpm)'] * Density_Water * SpecificHeat_Water) + Draw_Profile['Mains Temperature (deg F)']
+    Calculations.update(calculate_equal(Flow, Calculations['Mixed Water Volume (gal)'], Mains, DeltaT_Drain))
 
-    Savings_Equal = Draw_Profile['Savings Equal (Btu)'].sum()/100000
+    Savings_Equal = Calculations['Savings Equal (Btu)'].sum()/100000
 
-    End_Equal = time.time()
-    
-    print('Time_Equal is ' + str(End_Equal - Start_Equal))
+    if __debug__:
+        print('Time_Equal is ' + str(time.time() - Start_Equal))
 
     #Unequal-WaterHeater calculations
     
-    Start_UnequalWH = time.time()
+    if __debug__:
+        Start_UnequalWH = time.time()
 
-    Draw_Profile['Potable Flow Rate Unequal-WaterHeater (gal/min)'] = Draw_Profile['Flow Rate (gpm)'] * Calculate_Fraction_Cold_ThroughDWHR(Draw_Profile['Flow Rate (gpm)'], Draw_Profile['Mains Temperature (deg F)'], Temperature_Shower, Temperature_WaterHeater, 'Unequal_WaterHeater') #Use the Calculate_Fraction_Cold_ThroughDWHR function to identify the flow rate of water through the cold side of the DWHR device
-    Draw_Profile['Potable Flow Unequal-WaterHeater (gal)'] = Draw_Profile['Mixed Water Volume (gal)'] * Calculate_Fraction_Cold_ThroughDWHR(Draw_Profile['Flow Rate (gpm)'], Draw_Profile['Mains Temperature (deg F)'], Temperature_Shower, Temperature_WaterHeater, 'Unequal_WaterHeater') #Perform the same calculation for the volume instead of the flow rate
+    Fraction_Cold_UnequalWH = Fraction_Cold_Unequal_WaterHeater(Mains, Temperature_Shower, Temperature_WaterHeater) #Use the Unequal_WaterHeater energy balance to identify the fraction of water passing through the cold side of the DWHR device. It's the same for the flow rate and the volume, so it's only calculated once
+    Calculations['Potable Flow Rate Unequal-WaterHeater (gal/min)'] = Flow * Fraction_Cold_UnequalWH #Identify the flow rate of water through the cold side of the DWHR device
+    Calculations['Potable Flow Unequal-WaterHeater (gal)'] = Calculations['Mixed Water Volume (gal)'] * Fraction_Cold_UnequalWH #Perform the same calculation for the volume instead of the flow rate
 
-    Draw_Profile['FlowRate Cold Effectiveness Unequal-WaterHeater (gal/min)'] = np.where(Draw_Profile['Flow Rate (gpm)'] >= Draw_Profile['FlowRate Effectiveness Minimum (gal/min)'], Draw_Profile['Potable Flow Rate Unequal-WaterHeater (gal/min)'], Draw_Profile['FlowRate Effectiveness Minimum (gal/min)']) #In all rows where the cold side flow rate is larger than the minimum, keep the flow rate. Otherwise, replace the flow rate with the minimum
-    Draw_Profile['FlowRate Cold Effectiveness Unequal-WaterHeater (gal/min)'] = np.where(Draw_Profile['FlowRate Cold Effectiveness Unequal-WaterHeater (gal/min)'] <= Draw_Profile['FlowRate Effectiveness Maximum (gal/min)'], Draw_Profile['FlowRate Cold Effectiveness Unequal-WaterHeater (gal/min)'], Draw_Profile['FlowRate Effectiveness Maximum (gal/min)'])     #In all rows where the cold side flow rate is larger than the maximum, keep the flow rate. Otherwise, replace the flow rate with the maximum
+    Calculations['FlowRate Cold Effectiveness Unequal-WaterHeater (gal/min)'] = np.minimum(np.where(Flow >= FlowRate_Effectiveness_Minimum, Calculations['Potable Flow Rate Unequal-WaterHeater (gal/min)'], FlowRate_Effectiveness_Minimum), FlowRate_Effectiveness_Maximum) #In all rows where the total flow rate is larger than the minimum, keep the cold side flow rate. Otherwise, replace the flow rate with the minimum. Then limit the flow rate to the maximum
 
-    Draw_Profile['Effectiveness Unequal-WaterHeater (-)'] = polyval2d(Draw_Profile['FlowRate Effectiveness Equal (gal/min)'], Draw_Profile['FlowRate Cold Effectiveness Unequal-WaterHeater (gal/min)'], Coefficients_Generic_Vertical_Unequal) * Effectiveness_Rated #Call the polyval2d function using the specified flow rates and the loaded coefficients to identify the effectiveness correction factor for this scenario. Then multiply by the rated effectiveness to find the actual effectiveness in this draw
-    Draw_Profile['Savings Unequal-WaterHeater (Btu)'] = Draw_Profile['Effectiveness Unequal-WaterHeater (-)'] * Draw_Profile['Potable Flow Unequal-WaterHeater (gal)'] * Density_Water * SpecificHeat_Water * (Temperature_Drain_Inlet - Draw_Profile['Mains Temperature (deg F)']) #Multiply the effectiveness by the total available heat to identify the amount of energy saved
-    Draw_Profile['Heat Transfer Rate, Unequal-WaterHeater (Btu/min)'] = Draw_Profile['Effectiveness Unequal-WaterHeater (-)'] * Draw_Profile['Potable Flow Rate Unequal-WaterHeater (gal/min)'] * Density_Water * SpecificHeat_Water * (Temperature_Drain_Inlet - Draw_Profile['Mains Temperature (deg F)'])
-    Draw_Profile['Cold-Side Outlet Temperature, Unequal-WaterHeater (deg F)'] = Draw_Profile['Heat Transfer Rate, Unequal-WaterHeater (Btu/min)'] / (Draw_Profile['Potable Flow Rate Unequal-WaterHeater (gal/min)'] * Density_Water * SpecificHeat_Water) + Draw_Profile['Mains Temperature (deg F)']
+    Calculations['Effectiveness Unequal-WaterHeater (-)'] = polyval2d(Calculations['FlowRate Effectiveness Equal (gal/min)'], Calculations['FlowRate Cold Effectiveness Unequal-WaterHeater (gal/min)'], Coefficients_Generic_Vertical_Unequal) * Effectiveness_Rated #Call the polyval2d function using the specified flow rates and the loaded coefficients to identify the effectiveness correction factor for this scenario. Then multiply by the rated effectiveness to find the actual effectiveness in this draw
+    Calculations['Savings Unequal-WaterHeater (Btu)'] = Calculations['Effectiveness Unequal-WaterHeater (-)'] * Calculations['Potable Flow Unequal-WaterHeater (gal)'] * HeatCapacity_Water * DeltaT_Drain #Multiply the effectiveness by the total available heat to identify the amount of energy saved
+    Calculations['Heat Transfer Rate, Unequal-WaterHeater (Btu/min)'] = Calculations['Effectiveness Unequal-WaterHeater (-)'] * Calculations['Potable Flow Rate Unequal-WaterHeater (gal/min)'] * HeatCapacity_Water * DeltaT_Drain
+    Calculations['Cold-Side Outlet Temperature, Unequal-WaterHeater (deg F)'] = Calculations['Effectiveness Unequal-WaterHeater (-)'] * DeltaT_Drain + Mains #The heat transfer rate divided by the cold side flow rate and heat capacity, with the flow rate and heat capacity cancelled out
     
-    Savings_Unequal_WaterHeater = Draw_Profile['Savings Unequal-WaterHeater (Btu)'].sum()/100000 #Sum the total energy savings and divide by 100000 to convert to therms
+    Savings_Unequal_WaterHeater = Calculations['Savings Unequal-WaterHeater (Btu)'].sum()/100000 #Sum the total energy savings and divide by 100000 to convert to therms
 
-    End_UnequalWH = time.time()
-    
-    print('Time_Unequal-WaterHeater is ' + str(End_UnequalWH - Start_UnequalWH))
+    if __debug__:
+        print('Time_Unequal-WaterHeater is ' + str(time.time() - Start_UnequalWH))
 
     #Unequal-Fixture calculations
 
-    Start_UnequalFixture = time.time()
-
-    #Initilizing iterative loop calculations
-    Draw_Profile['Cold-Side Outlet Temperature, Unequal-Fixture (deg F)'] = Draw_Profile['Mains Temperature (deg F)'] #Make the starting assumption that the temperature of water exiting the cold side of the device is equal to the mains inlet temperature
-    Draw_Profile['Flow Delta (gal/min)'] = 9999 #Flow_Delta represents the difference between the assumed cold-side flow rate and the calcualted cold-side flow rate. This is needed as unequal-shower configurations change the cold-side outlet temperature, which changes the flow rate, which changes the temperature, ... . It's an iterative solution that is considered solved when this difference is very small
-    Draw_Profile['Flow Cold ThroughDWHR, Unequal-Fixture (gal/min)'] = Draw_Profile['Flow Rate (gpm)'] - Draw_Profile['Hot Water Flow Rate (gpm)'] #Set the cold side flow rate equal to the total flow rate - the hot flow rate
-
-    j = 0 #I'm not sure that this is still useful
-
-    #Repeat this process iteratively until the solution is achieved
-    while Draw_Profile['Flow Delta (gal/min)'].max() >= 0.01: #Convergence is identified when the cold side flow rate before and after calculations differ by less than 0.01 gal/min. Continue these calculations until that is achieved
-        
-        Draw_Profile['FlowRate_Cold_Effectiveness Unequal-Fixture (gal/min)'] = np.where(Draw_Profile['Flow Cold ThroughDWHR, Unequal-Fixture (gal/min)'] >= Draw_Profile['FlowRate Effectiveness Minimum (gal/min)'], Draw_Profile['Flow Cold ThroughDWHR, Unequal-Fixture (gal/min)'], Draw_Profile['FlowRate Effectiveness Minimum (gal/min)']) #In all rows where the cold side flow rate is larger than the minimum, keep the flow rate. Otherwise, replace the flow rate with the minimum
-        Draw_Profile['FlowRate_Cold_Effectiveness Unequal-Fixture (gal/min)'] = np.where(Draw_Profile['FlowRate_Cold_Effectiveness Unequal-Fixture (gal/min)'] <= Draw_Profile['FlowRate Effectiveness Maximum (gal/min)'], Draw_Profile['FlowRate_Cold_Effectiveness Unequal-Fixture (gal/min)'], Draw_Profile['FlowRate Effectiveness Maximum (gal/min)'])     #In all rows where the cold side flow rate is larger than the maximum, keep the flow rate. Otherwise, replace the flow rate with the maximum
-        Draw_Profile['FlowRate_Draw_Effectiveness Unequal-Fixture (gal/min)'] = np.where(Draw_Profile['Flow Rate (gpm)'] >= Draw_Profile['FlowRate Effectiveness Minimum (gal/min)'], Draw_Profile['Flow Rate (gpm)'], Draw_Profile['FlowRate Effectiveness Minimum (gal/min)']) #Performs the same process for the mixed water flow rates
-        Draw_Profile['FlowRate_Draw_Effectiveness Unequal-Fixture (gal/min)'] = np.where(Draw_Profile['FlowRate_Draw_Effectiveness Unequal-Fixture (gal/min)'] <= Draw_Profile['FlowRate Effectiveness Maximum (gal/min)'], Draw_Profile['FlowRate_Draw_Effectiveness Unequal-Fixture (gal/min)'], Draw_Profile['FlowRate Effectiveness Maximum (gal/min)'])
-        Draw_Profile['FlowRate Minimum, Unequal-Fixture (gal/min)'] = Draw_Profile['Flow Rate (gpm)'].combine(Draw_Profile['Flow Cold ThroughDWHR, Unequal-Fixture (gal/min)'], min, 0) #Ensure that under no circumstances is a flow rate less than 0 gal/min used     
-
-        Draw_Profile['Effectiveness_Draw Equal, Flow=Cold (-)'] = FourthOrder(Coefficients_Generic_Vertical_Equal, Draw_Profile['FlowRate Minimum, Unequal-Fixture (gal/min)']) * Effectiveness_Rated
-        Draw_Profile['HeatRecovered_Draw Equal, Flow=Cold (Btu)'] = Draw_Profile['Effectiveness_Draw Equal, Flow=Cold (-)'] * Draw_Profile['FlowRate Minimum, Unequal-Fixture (gal/min)'] * Density_Water * SpecificHeat_Water * (Temperature_Drain_Inlet - Draw_Profile['Mains Temperature (deg F)']) * Draw_Profile['Duration (min)'] #Calcualte the energy recovered in the draw using Q_dot = m_dot * C_p * dT            
-        Draw_Profile['HeatRecoveryRate_Equal, Flow=Cold (Btu/min)'] = Draw_Profile['Effectiveness_Draw Equal, Flow=Cold (-)'] * Draw_Profile['FlowRate Minimum, Unequal-Fixture (gal/min)'] * Density_Water * SpecificHeat_Water * (Temperature_Drain_Inlet - Draw_Profile['Mains Temperature (deg F)']) #Calcualte the heat recovery rate of each draw in Btu/min
-            
-        Draw_Profile['Flow Ratio, Unequal-Fixture'] = Draw_Profile['Flow Rate (gpm)'] / Draw_Profile['Flow Cold ThroughDWHR, Unequal-Fixture (gal/min)'] #Calculate the flow ratio for this draw, per Ramin Manoucherri's paper and calculation method        
-        Draw_Profile['HeatRecoveryRate, Unequal-Fixture (Btu/min)'] = Draw_Profile['HeatRecoveryRate_Equal, Flow=Cold (Btu/min)'] * (0.3452 * Draw_Profile['Flow Ratio, Unequal-Fixture'].apply(log) + 1) #Calculate the heat recovery rate per Ramin Manoucheri's paper and method        
-        Draw_Profile['HeatRecovered, Unequal-Fixture (Btu)'] = Draw_Profile['HeatRecoveryRate, Unequal-Fixture (Btu/min)'] * Draw_Profile['Duration (min)'] #Calculate the energy recovered in each draw        
-        Draw_Profile['Cold-Side Outlet Temperature, Unequal-Fixture (deg F)'] = Draw_Profile['HeatRecoveryRate, Unequal-Fixture (Btu/min)'] / (Draw_Profile['Flow Cold ThroughDWHR, Unequal-Fixture (gal/min)'] * SpecificHeat_Water * Density_Water) + Draw_Profile['Mains Temperature (deg F)'] #Calculate the outlet temperature of the DWHR device in this draw
-       
-        Draw_Profile['Flow Cold ThroughDWHR, PostCalcuations (gal/min)'] = Calculate_Fraction_Cold_ThroughDWHR(Draw_Profile['Flow Rate (gpm)'], Draw_Profile['Cold-Side Outlet Temperature, Unequal-Fixture (deg F)'], Temperature_Shower, Temperature_WaterHeater, 'Unequal_Fixture') * Draw_Profile['Flow Rate (gpm)'] #Calculate the cold-side flow rate through the DWHR device using the newly calculated cold-side outlet temperature            
-        Draw_Profile['Flow Delta (gal/min)'] = abs(Draw_Profile['Flow Cold ThroughDWHR, Unequal-Fixture (gal/min)'] - Draw_Profile['Flow Cold ThroughDWHR, PostCalcuations (gal/min)']) #Calculate the difference between the cold-side flow rate before and after calculations
-        Draw_Profile['Flow Cold ThroughDWHR, Unequal-Fixture (gal/min)'] = Draw_Profile['Flow Cold ThroughDWHR, PostCalcuations (gal/min)'] #Set the cold-side flow rate through the device equal to the new cold-side flow rate through the device, so it's treated as the starting point in the next iteration
-
-        j += 1
-
-    Savings_Unequal_Fixture = Draw_Profile['HeatRecovered, Unequal-Fixture (Btu)'].sum()/100000 #Sum the energy savings and convert from Btu to therms
-
-    End_UnequalFixture = time.time()
-    
-    print('Time_UnequalFixture is ' + str(End_UnequalFixture - Start_UnequalFixture))
+    if __debug__:
+        Start_UnequalFixture = time.time()
 
-#%%----------------SAVE DATA----------------------------
+    HeatRecovered, Flow_Cold, Temperature_Cold_Outlet, Effectiveness_Cold, HeatRecoveryRate = solve_unequal_fixture(Flow, Mains, Hot, Duration, Coefficients_Generic_Vertical_Equal, Effectiveness_Rated, Temperature_Drain_Inlet, Temperature_Shower, Temperature_WaterHeater, HeatCapacity_Water) #Iterate each draw to convergence
 
-    print('i is ' + str(i))
-    print('Equal: ' + str(Savings_Equal))
-    print('Unequal-WH: ' + str(Savings_Unequal_WaterHeater))
-    print('Unequal-Fixture: ' +str(Savings_Unequal_Fixture))
-    
-    Temp.loc[0, 'Filename'] = i
-    Temp.loc[0, 'Savings, Equal (therms)'] = Savings_Equal
-    Temp.loc[0, 'Savings, Unequal-WaterHeater (therms)'] = Savings_Unequal_WaterHeater
-    Temp.loc[0, 'Savings, Unequal-Fixture (therms)'] = Savings_Unequal_Fixture
-    
-    Results = Results.append(Temp)
+    Calculations['Cold-Side Outlet Temperature, Unequal-Fixture (deg F)'] = Temperature_Cold_Outlet
+    Calculations['Flow Cold ThroughDWHR, Unequal-Fixture (gal/min)'] = Flow_Cold
+    Calculations['Effectiveness_Draw Equal, Flow=Cold (-)'] = Effectiveness_Cold
+    Calculations['HeatRecoveryRate, Unequal-Fixture (Btu/min)'] = HeatRecoveryRate
+    Calculations['HeatRecovered, Unequal-Fixture (Btu)'] = HeatRecovered
 
-    Draw_Profile.to_csv(i + '_Analyzed.csv', index = False) #Save the performed calcualtsion to a new file with the same name followed by '_Analyzed'
-    
-Results.to_csv(r'C:\Users\Peter Grant\Desktop\DWHRAnalysis\Results.csv', index = False)    
+    Savings_Unequal_Fixture = Calculations['HeatRecovered, Unequal-Fixture (Btu)'].sum()/100000 #Sum the energy savings and convert from Btu to therms
+
+    if __debug__:
+        print('Time_UnequalFixture is ' + str(time.time() - Start_UnequalFixture))
+
+    Draw_Profile = pd.concat([Draw_Profile.drop(columns = list(Calculations), errors = 'ignore'), pd.DataFrame(Calculations, index = Draw_Profile.index)], axis = 1) #Add all of the calculated columns to the draw profile in one step, replacing any columns with the same name
+
+    if Output_Format == 'parquet':
+        Draw_Profile.to_parquet(Path_DrawProfile + '_Analyzed.parquet', engine = 'pyarrow', compression = 'snappy', index = False) #Save the performed calcualtsion to a new file with the same name followed by '_Analyzed'
+    else:
+        Draw_Profile.to_csv(Path_DrawProfile + '_Analyzed.csv', index = False)
 
+    return {'Filename': Path_DrawProfile, 'Savings, Equal (therms)': Savings_Equal, 'Savings, Unequal-WaterHeater (therms)': Savings_Unequal_WaterHeater, 'Savings, Unequal-Fixture (therms)': Savings_Unequal_Fixture}
+
+#This function reads the savings in each configuration back out of a previously analyzed draw profile, so draw profiles that haven't changed still appear in Results.
+#Returns None if the analyzed file can't be read or doesn't have the savings columns (E.g. it was saved by an older version of this script), so the draw profile
+#is analyzed again instead
+def read_analyzed_savings(Path_DrawProfile, Path_Analyzed):
+    Columns_Savings = ['Savings Equal (Btu)', 'Savings Unequal-WaterHeater (Btu)', 'HeatRecovered, Unequal-Fixture (Btu)']
+    try:
+        if Path_Analyzed.endswith('.parquet'):
+            Savings = pd.read_parquet(Path_Analyzed, engine = 'pyarrow', columns = Columns_Savings).sum()/100000 #Only the savings columns are read, then summed and converted to therms
+        else:
+            Savings = pd.read_csv(Path_Analyzed, engine = 'pyarrow', usecols = Columns_Savings).sum()/100000
+    except (KeyError, ValueError, OSError): #pyarrow raises ArrowKeyError (A KeyError) for missing columns and ArrowInvalid (A ValueError) or OSError for damaged files
+        return None
+
+    return {'Filename': Path_DrawProfile, 'Savings, Equal (therms)': Savings['Savings Equal (Btu)'], 'Savings, Unequal-WaterHeater (therms)': Savings['Savings Unequal-WaterHeater (Btu)'], 'Savings, Unequal-Fixture (therms)': Savings['HeatRecovered, Unequal-Fixture (Btu)']}
+
+#%%----------------SAVE DATA----------------------------
 
+if __name__ == '__main__': #The analysis only runs when the script is executed directly, not when the worker processes import it
+    Draw_Profiles = [] #The draw profiles that need to be analyzed
+    Results_Rows = [] #The savings of each draw profile
+    Time_Script = os.path.getmtime(__file__) #The inputs and constants live in this script, so an analyzed file older than the script may have used different settings
+    for Entry in os.scandir(Path_DrawProfiles): #Scan the Path_DrawProfiles folder once. The file sizes and modification times come with each entry
+        if not Entry.is_file() or not Entry.name.endswith(('.csv', '.parquet')) or '_Analyzed.' in Entry.name or os.path.abspath(Entry.path) == os.path.abspath(Path_Results): #Skip anything that isn't a draw profile, including the analyzed files and Results file saved by previous runs
+            continue
+        Path_Analyzed = Entry.path + '_Analyzed.' + Output_Format
+        if not Reanalyze_All and os.path.exists(Path_Analyzed) and os.path.getmtime(Path_Analyzed) >= max(Entry.stat().st_mtime, Time_Script): #Neither the draw profile nor the script has changed since it was last analyzed
+            Savings = read_analyzed_savings(Entry.path, Path_Analyzed)
+            if Savings is not None:
+                Results_Rows.append(Savings)
+                continue
+        Draw_Profiles.append(Entry.path)
+
+    print('Skipping ' + str(len(Results_Rows)) + ' draw profiles that are already analyzed')
+
+    Processors = config.NUMBA_NUM_THREADS #The processors this script may use. numba sets this from the processors the script is allowed to run on (taskset, container or SLURM limits) or the NUMBA_NUM_THREADS environment variable, and won't start more threads than this
+    Workers = max(1, min(Processors, len(Draw_Profiles))) #Use one process per draw profile, up to the number of processors
+    ChunkSize = max(1, len(Draw_Profiles) // (Workers * 2)) #Send the draw profiles to the processes in roughly two groups per process, so a few large draw profiles don't leave the other processes idle
+
+    #Each process gets an equal share of the processors for the numba threads in solve_unequal_fixture, so the processes and threads together don't oversubscribe the machine
+    with ProcessPoolExecutor(max_workers = Workers, initializer = set_num_threads, initargs = (min(max(1, Processors // Workers), config.NUMBA_NUM_THREADS),)) as Executor:
+        for Savings in Executor.map(analyze_profile, Draw_Profiles, chunksize = ChunkSize): #Repeat once for each file in Draw_Profiles, in the same order as Draw_Profiles
+            print('i is ' + str(Savings['Filename']))
+            print('Equal: ' + str(Savings['Savings, Equal (therms)']))
+            print('Unequal-WH: ' + str(Savings['Savings, Unequal-WaterHeater (therms)']))
+            print('Unequal-Fixture: ' +str(Savings['Savings, Unequal-Fixture (therms)']))
+
+            Results_Rows.append(Savings)
+
+    Results_Rows.sort(key = lambda Row: Row['Filename']) #The skipped draw profiles were added first. Sort by file name so Results.csv is in the same order whichever draw profiles were analyzed
+    Results = pd.DataFrame(Results_Rows, columns = Results_Columns) #Create the Results data frame in one step, instead of copying it every time a draw profile is added
+    Results.to_csv(Path_Results, index = False)